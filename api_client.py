@@ -1,53 +1,376 @@
-import requests
+import asyncio
+import httpx
 import time
+import random
 import logging
+import threading
+import numpy as np
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 from abc import ABC, abstractmethod
 from config import APIConfig
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class KlineBatch:
+    """Lote de candlesticks em formato colunar (arrays numpy)
+
+    Em vez de um dict por candle, cada campo vira um ndarray convertido
+    da resposta crua em uma única passada vetorizada. Os arrays ficam
+    sempre em ordem crescente de open_time, independente do provedor.
+    """
+
+    __slots__ = ('symbol', 'open_time', 'open', 'high', 'low', 'close',
+                 'volume', 'close_time')
+
+    def __init__(self, symbol: str, open_time, open_, high, low, close,
+                 volume, close_time):
+        self.symbol = symbol
+        self.open_time = open_time
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.close_time = close_time
+
+    def __len__(self) -> int:
+        return len(self.open_time)
+
+    @property
+    def latest_open_time(self) -> int:
+        """open_time do candle mais recente, em O(1)
+
+        Os arrays são sempre normalizados para ordem crescente em
+        from_rows, então o último elemento é o mais recente.
+        """
+        return int(self.open_time[-1])
+
+    def to_rows(self, interval_time: str = '1m', price_scale: int = 1) -> List[Dict]:
+        """Gera os mappings prontos para o INSERT em lote de candles
+
+        Uma única passada sobre as colunas já convertidas (tolist() faz a
+        conversão ndarray->Python em C); nenhum objeto intermediário por
+        candle além do próprio mapping exigido pelo executemany.
+        `price_scale` converte preços/volume para inteiros escalados de
+        forma vetorizada, sem um round() por valor.
+        """
+        # Empilhar as cinco colunas numéricas em um único bloco contíguo
+        # funde a normalização em uma multiplicação, um rint e um cast
+        # sobre o lote inteiro, em vez de cinco passadas separadas
+        values = np.stack((self.open, self.high, self.low,
+                           self.close, self.volume))
+
+        if price_scale != 1:
+            # rint antes do cast evita truncamento de erros de ponto flutuante
+            values = np.rint(values * price_scale).astype(np.int64)
+
+        symbol = self.symbol
+        return [
+            {
+                'symbol': symbol,
+                'interval_time': interval_time,
+                'open_price': open_,
+                'high_price': high,
+                'low_price': low,
+                'close_price': close,
+                'volume': volume,
+                'timestamp': ts
+            }
+            for ts, (open_, high, low, close, volume) in zip(
+                self.open_time.tolist(), values.T.tolist()
+            )
+        ]
+
+    @classmethod
+    def from_rows(cls, symbol: str, rows: List[list], ascending: bool = True,
+                  close_time_index: Optional[int] = None) -> 'KlineBatch':
+        """Converte a resposta crua (lista de listas) em arrays colunares
+
+        As primeiras 6 colunas devem ser open_time, open, high, low,
+        close e volume. `close_time_index` aponta a coluna de close_time
+        quando o provedor a fornece; caso contrário é open_time + 1 min.
+        """
+        if not rows:
+            empty_i = np.empty(0, dtype=np.int64)
+            empty_f = np.empty(0, dtype=np.float64)
+            return cls(symbol, empty_i, empty_f, empty_f, empty_f,
+                       empty_f, empty_f, empty_i)
+
+        # Uma única conversão vetorizada de todas as colunas numéricas
+        arr = np.asarray(rows, dtype=np.float64)
+        if not ascending:
+            arr = arr[::-1]
+
+        open_time = arr[:, 0].astype(np.int64)
+
+        if close_time_index is not None:
+            close_time = arr[:, close_time_index].astype(np.int64)
+        else:
+            close_time = open_time + 60000  # +1 minuto
+
+        return cls(symbol, open_time, arr[:, 1], arr[:, 2], arr[:, 3],
+                   arr[:, 4], arr[:, 5], close_time)
+
+class TokenBucket:
+    """Token bucket para controle de requisições, compartilhável entre threads
+
+    Tokens acumulam a `rate` por segundo até `capacity`; cada requisição
+    consome um token e só bloqueia quando o bucket está vazio, permitindo
+    rajadas curtas sem ultrapassar a taxa média configurada.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill_and_take(self) -> float:
+        """Tenta consumir um token; retorna 0.0 ou o tempo de espera necessário"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> None:
+        """Bloqueia até haver um token disponível e o consome"""
+        while True:
+            wait_time = self._refill_and_take()
+            if wait_time == 0.0:
+                return
+
+            # Dormir fora do lock para não bloquear outras threads
+            time.sleep(wait_time)
+
+    async def acquire_async(self) -> None:
+        """Versão assíncrona de acquire, que cede o event loop ao esperar"""
+        while True:
+            wait_time = self._refill_and_take()
+            if wait_time == 0.0:
+                return
+
+            await asyncio.sleep(wait_time)
+
+    def drain(self) -> None:
+        """Esvazia o bucket, forçando as próximas requisições a aguardar o refill"""
+        with self._lock:
+            self._tokens = 0.0
+            self._last = time.monotonic()
+
 class APIClient(ABC):
     """Classe base para clientes de API"""
-    
+
+    # Fração do rate limit a partir da qual o cliente reduz o ritmo
+    USAGE_THRESHOLD = 0.9
+
+    # Política de retry: apenas erros transitórios valem nova tentativa
+    RETRIABLE_STATUS = {429, 500, 502, 503, 504}
+    BACKOFF_BASE = 0.5   # segundos
+    BACKOFF_CAP = 30.0   # segundos
+
+    # Tamanho do pool de conexões HTTP, dimensionado para os workers do coletor
+    POOL_SIZE = 32
+
     def __init__(self, config: APIConfig):
         self.config = config
-        self.session = requests.Session()
-        self.session.timeout = config.timeout
-        self.last_request_time = 0
         self.logger = logging.getLogger(self.__class__.__name__)
-    
+
+        # Cliente HTTP/2: multiplexa as requisições concorrentes sobre uma
+        # única conexão TLS, sem head-of-line blocking do HTTP/1.1.
+        # O pool continua dimensionado para os workers do coletor.
+        self.session = httpx.Client(
+            http2=True,
+            timeout=config.timeout,
+            limits=httpx.Limits(max_connections=self.POOL_SIZE,
+                                max_keepalive_connections=self.POOL_SIZE),
+            headers={'Accept-Encoding': 'gzip'}
+        )
+
+        # Cliente assíncrono criado sob demanda por get_klines_async
+        self._async_session: Optional[httpx.AsyncClient] = None
+
+        # Resolver DNS e abrir a conexão TLS já na inicialização, para a
+        # primeira requisição real não pagar esses round-trips
+        self._warmup()
+
+        # config.rate_limit é o intervalo mínimo entre requisições (segundos);
+        # o bucket trabalha com taxa (req/s) e aceita rajada de até 2 segundos
+        if config.rate_limit > 0:
+            rate = 1.0 / config.rate_limit
+            self._bucket = TokenBucket(rate=rate, capacity=max(1.0, rate * 2))
+        else:
+            self._bucket = None
+
+    # Endpoint leve usado pelo warm-up; definido por cada subclasse
+    PING_ENDPOINT: Optional[str] = None
+
+    def _warmup(self) -> None:
+        """Aquece DNS e handshake TLS com uma requisição leve, em melhor esforço"""
+        if self.PING_ENDPOINT is None:
+            return
+
+        try:
+            self.session.head(f"{self.config.base_url}{self.PING_ENDPOINT}", timeout=2)
+        except Exception:
+            # Sem conectividade agora não é fatal: a primeira requisição
+            # real paga o handshake como antes
+            pass
+
     def _rate_limit(self):
         """Controla limite de requisições"""
-        elapsed = time.time() - self.last_request_time
-        wait_time = self.config.rate_limit - elapsed
-        
-        if wait_time > 0:
-            time.sleep(wait_time)
-        
-        self.last_request_time = time.time()
-    
+        if self._bucket is not None:
+            self._bucket.acquire()
+
+    def _rate_limit_usage(self, response) -> Optional[float]:
+        """Extrai dos headers a fração utilizada do rate limit (0.0 a 1.0)
+
+        Cada subclasse interpreta os headers específicos do seu provedor.
+        Retorna None quando os headers não estão presentes.
+        """
+        return None
+
+    def _check_rate_headers(self, response) -> None:
+        """Reduz o ritmo quando os headers indicam rate limit quase esgotado"""
+        try:
+            usage = self._rate_limit_usage(response)
+        except (TypeError, ValueError):
+            return
+
+        if usage is not None and usage >= self.USAGE_THRESHOLD and self._bucket is not None:
+            self.logger.warning(f"Rate limit em {usage:.0%} de uso, reduzindo ritmo")
+            self._bucket.drain()
+
+    def _retry_sleep_time(self, exc: httpx.HTTPError, prev_sleep: float) -> Optional[float]:
+        """Decide se o erro é retriável e calcula o tempo de espera
+
+        Retorna None para erros não-retriáveis (4xx exceto 429), que devem
+        ser propagados imediatamente. Um Retry-After do servidor tem
+        precedência; caso contrário usa backoff decorrelacionado com
+        jitter, evitando que os workers tentem de novo em sincronia.
+        """
+        resp = getattr(exc, 'response', None)
+        status = resp.status_code if resp is not None else None
+
+        if status is not None and status not in self.RETRIABLE_STATUS:
+            return None
+
+        if status == 429:
+            retry_after = resp.headers.get('Retry-After')
+            if retry_after is not None:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+
+        return min(self.BACKOFF_CAP, random.uniform(self.BACKOFF_BASE, prev_sleep * 3))
+
     def _make_request(self, endpoint: str, params: Dict = None) -> Dict:
         """Faz requisição HTTP com retry"""
+        return self._request(f"{self.config.base_url}{endpoint}", params)
+
+    def _request(self, url: str, params: Dict = None) -> Dict:
+        """Faz requisição HTTP para uma URL absoluta, com retry"""
         self._rate_limit()
-        url = f"{self.config.base_url}{endpoint}"
-        
+        prev_sleep = self.BACKOFF_BASE
+
         for attempt in range(self.config.max_retries):
             try:
                 response = self.session.get(url, params=params)
                 response.raise_for_status()
+
+                # Throttling reativo baseado nos headers de rate limit
+                self._check_rate_headers(response)
+
+                # orjson decodifica os bytes direto, sem round-trip por str
+                if orjson is not None:
+                    return orjson.loads(response.content)
                 return response.json()
-            
-            except requests.exceptions.RequestException as e:
+
+            except httpx.HTTPError as e:
+                sleep_for = self._retry_sleep_time(e, prev_sleep)
+                if sleep_for is None:
+                    raise  # erro não-retriável
+
                 self.logger.warning(f"Tentativa {attempt + 1} falhou: {e}")
                 if attempt == self.config.max_retries - 1:
                     raise
-                time.sleep(2 ** attempt)  # Backoff exponencial
-    
+
+                prev_sleep = sleep_for
+                time.sleep(sleep_for)
+
+    def _get_async_session(self) -> httpx.AsyncClient:
+        """Retorna o cliente assíncrono, criando-o na primeira chamada"""
+        if self._async_session is None:
+            self._async_session = httpx.AsyncClient(
+                http2=True,
+                timeout=self.config.timeout,
+                limits=httpx.Limits(max_connections=self.POOL_SIZE,
+                                    max_keepalive_connections=self.POOL_SIZE),
+                headers={'Accept-Encoding': 'gzip'}
+            )
+        return self._async_session
+
+    async def _make_request_async(self, endpoint: str, params: Dict = None) -> Dict:
+        """Versão assíncrona de _make_request, com o mesmo retry"""
+        return await self._request_async(f"{self.config.base_url}{endpoint}", params)
+
+    async def _request_async(self, url: str, params: Dict = None) -> Dict:
+        """Versão assíncrona de _request"""
+        if self._bucket is not None:
+            await self._bucket.acquire_async()
+
+        session = self._get_async_session()
+        prev_sleep = self.BACKOFF_BASE
+
+        for attempt in range(self.config.max_retries):
+            try:
+                response = await session.get(url, params=params)
+                response.raise_for_status()
+
+                self._check_rate_headers(response)
+
+                if orjson is not None:
+                    return orjson.loads(response.content)
+                return response.json()
+
+            except httpx.HTTPError as e:
+                sleep_for = self._retry_sleep_time(e, prev_sleep)
+                if sleep_for is None:
+                    raise  # erro não-retriável
+
+                self.logger.warning(f"Tentativa {attempt + 1} falhou: {e}")
+                if attempt == self.config.max_retries - 1:
+                    raise
+
+                prev_sleep = sleep_for
+                await asyncio.sleep(sleep_for)
+
+    def close(self) -> None:
+        """Fecha o cliente HTTP síncrono"""
+        self.session.close()
+
+    async def aclose(self) -> None:
+        """Fecha o cliente HTTP assíncrono, se foi criado"""
+        if self._async_session is not None:
+            await self._async_session.aclose()
+            self._async_session = None
+
     @abstractmethod
-    def get_klines(self, symbol: str, interval: str = '1m', 
-                   start_time: Optional[int] = None, 
-                   end_time: Optional[int] = None, 
-                   limit: int = 1000) -> List[Dict]:
+    def get_klines(self, symbol: str, interval: str = '1m',
+                   start_time: Optional[int] = None,
+                   end_time: Optional[int] = None,
+                   limit: int = 1000) -> KlineBatch:
         """Método abstrato para buscar dados de candlesticks"""
         pass
     
@@ -58,50 +381,85 @@ class APIClient(ABC):
 
 class BybitClient(APIClient):
     """Cliente para API da Bybit"""
-    
-    def get_klines(self, symbol: str, interval: str = '1', 
-                   start_time: Optional[int] = None, 
-                   end_time: Optional[int] = None, 
-                   limit: int = 1000) -> List[Dict]:
-        """Busca dados de candlesticks da Bybit"""
-        
+
+    PING_ENDPOINT = '/v5/market/time'
+
+    def _rate_limit_usage(self, response) -> Optional[float]:
+        """Interpreta os headers X-Bapi-Limit-* da Bybit"""
+        remaining = response.headers.get('X-Bapi-Limit-Status')
+        limit = response.headers.get('X-Bapi-Limit')
+
+        if remaining is None or limit is None or float(limit) <= 0:
+            return None
+
+        return 1.0 - float(remaining) / float(limit)
+
+    KLINE_ENDPOINT = '/v5/market/kline'
+
+    def __init__(self, config: APIConfig):
+        super().__init__(config)
+
+        # Especialização do endpoint quente: URL e parâmetros fixos
+        # montados uma única vez, fora do caminho por requisição
+        self._kline_url = config.base_url + self.KLINE_ENDPOINT
+        self._kline_base_params = {'category': 'spot'}
+
+    def _kline_params(self, symbol: str, interval: str,
+                      start_time: Optional[int], end_time: Optional[int],
+                      limit: int) -> Dict:
+        """Monta os parâmetros do endpoint de klines da Bybit"""
         params = {
-            'category': 'spot',
+            **self._kline_base_params,
             'symbol': symbol,
             'interval': interval,
             'limit': min(limit, 1000)  # Bybit limita a 1000
         }
-        
+
         if start_time:
             params['start'] = start_time
         if end_time:
             params['end'] = end_time
-        
+
+        return params
+
+    def _parse_klines(self, symbol: str, response: Dict) -> KlineBatch:
+        """Converte a resposta de klines da Bybit em KlineBatch"""
+        if response.get('retCode') != 0:
+            raise Exception(f"Erro da API Bybit: {response.get('retMsg')}")
+
+        klines = response.get('result', {}).get('list', [])
+
+        # Bybit retorna em ordem decrescente; o batch normaliza para crescente
+        return KlineBatch.from_rows(symbol, klines, ascending=False)
+
+    def get_klines(self, symbol: str, interval: str = '1',
+                   start_time: Optional[int] = None,
+                   end_time: Optional[int] = None,
+                   limit: int = 1000) -> KlineBatch:
+        """Busca dados de candlesticks da Bybit"""
         try:
-            response = self._make_request('/v5/market/kline', params)
-           # print(f"URL REQUISITADA:'/v5/market/kline' {params}")
-            
-            if response.get('retCode') != 0:
-                raise Exception(f"Erro da API Bybit: {response.get('retMsg')}")
-            
-            klines = response.get('result', {}).get('list', [])
-            
-            # Converter formato Bybit para formato padrão
-            converted_klines = []
-            for kline in klines:
-                converted_klines.append({
-                    'open_time': int(kline[0]),
-                    'open': float(kline[1]),
-                    'high': float(kline[2]),
-                    'low': float(kline[3]),
-                    'close': float(kline[4]),
-                    'volume': float(kline[5]),
-                    'close_time': int(kline[0]) + 60000,  # +1 minuto
-                    'symbol': symbol
-                })
-            
-            return converted_klines
-            
+            response = self._request(
+                self._kline_url,
+                self._kline_params(symbol, interval, start_time, end_time, limit)
+            )
+            return self._parse_klines(symbol, response)
+
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar klines da Bybit para {symbol}: {e}")
+            raise
+
+    async def get_klines_async(self, symbol: str, interval: str = '1',
+                               start_time: Optional[int] = None,
+                               end_time: Optional[int] = None,
+                               limit: int = 1000) -> KlineBatch:
+        """Versão assíncrona de get_klines"""
+        try:
+            response = await self._request_async(
+                self._kline_url,
+                self._kline_params(symbol, interval, start_time, end_time, limit)
+            )
+            return self._parse_klines(symbol, response)
+
         except Exception as e:
             self.logger.error(f"Erro ao buscar klines da Bybit para {symbol}: {e}")
             raise
@@ -127,43 +485,79 @@ class BybitClient(APIClient):
 
 class BinanceClient(APIClient):
     """Cliente para API da Binance"""
-    
-    def get_klines(self, symbol: str, interval: str = '1m', 
-                   start_time: Optional[int] = None, 
-                   end_time: Optional[int] = None, 
-                   limit: int = 1000) -> List[Dict]:
-        """Busca dados de candlesticks da Binance"""
-        
+
+    PING_ENDPOINT = '/api/v3/ping'
+
+    # Peso máximo por minuto permitido pela Binance para endpoints públicos
+    WEIGHT_LIMIT_1M = 1200
+
+    def _rate_limit_usage(self, response) -> Optional[float]:
+        """Interpreta o header X-MBX-USED-WEIGHT-1M da Binance"""
+        used = response.headers.get('X-MBX-USED-WEIGHT-1M')
+
+        if used is None:
+            return None
+
+        return float(used) / self.WEIGHT_LIMIT_1M
+
+    KLINE_ENDPOINT = '/api/v3/klines'
+
+    def __init__(self, config: APIConfig):
+        super().__init__(config)
+
+        # URL do endpoint quente montada uma única vez
+        self._kline_url = config.base_url + self.KLINE_ENDPOINT
+
+    def _kline_params(self, symbol: str, interval: str,
+                      start_time: Optional[int], end_time: Optional[int],
+                      limit: int) -> Dict:
+        """Monta os parâmetros do endpoint de klines da Binance"""
         params = {
             'symbol': symbol,
             'interval': interval,
             'limit': min(limit, 1000)  # Binance limita a 1000
         }
-        
+
         if start_time:
             params['startTime'] = start_time
         if end_time:
             params['endTime'] = end_time
-        
+
+        return params
+
+    def _parse_klines(self, symbol: str, response: List) -> KlineBatch:
+        """Converte a resposta de klines da Binance em KlineBatch"""
+        # Binance já retorna em ordem crescente, com close_time na coluna 6
+        return KlineBatch.from_rows(symbol, response, close_time_index=6)
+
+    def get_klines(self, symbol: str, interval: str = '1m',
+                   start_time: Optional[int] = None,
+                   end_time: Optional[int] = None,
+                   limit: int = 1000) -> KlineBatch:
+        """Busca dados de candlesticks da Binance"""
         try:
-            response = self._make_request('/api/v3/klines', params)
-            
-            # Converter formato Binance para formato padrão
-            converted_klines = []
-            for kline in response:
-                converted_klines.append({
-                    'open_time': int(kline[0]),
-                    'open': float(kline[1]),
-                    'high': float(kline[2]),
-                    'low': float(kline[3]),
-                    'close': float(kline[4]),
-                    'volume': float(kline[5]),
-                    'close_time': int(kline[6]),
-                    'symbol': symbol
-                })
-            
-            return converted_klines
-            
+            response = self._request(
+                self._kline_url,
+                self._kline_params(symbol, interval, start_time, end_time, limit)
+            )
+            return self._parse_klines(symbol, response)
+
+        except Exception as e:
+            self.logger.error(f"Erro ao buscar klines da Binance para {symbol}: {e}")
+            raise
+
+    async def get_klines_async(self, symbol: str, interval: str = '1m',
+                               start_time: Optional[int] = None,
+                               end_time: Optional[int] = None,
+                               limit: int = 1000) -> KlineBatch:
+        """Versão assíncrona de get_klines"""
+        try:
+            response = await self._request_async(
+                self._kline_url,
+                self._kline_params(symbol, interval, start_time, end_time, limit)
+            )
+            return self._parse_klines(symbol, response)
+
         except Exception as e:
             self.logger.error(f"Erro ao buscar klines da Binance para {symbol}: {e}")
             raise
@@ -182,24 +576,25 @@ class BinanceClient(APIClient):
             self.logger.error(f"Erro ao buscar símbolos da Binance: {e}")
             raise
 
+# Registro de clientes suportados, montado uma única vez na importação
+# (chaves já em minúsculas)
+_CLIENTS: Dict[str, type] = {
+    'bybit': BybitClient,
+    'binance': BinanceClient
+}
+
 class APIClientFactory:
     """Factory para criar clientes de API"""
-    
+
     @staticmethod
     def create_client(api_name: str, config: APIConfig) -> APIClient:
         """Cria cliente de API baseado no nome"""
-        clients = {
-            'bybit': BybitClient,
-            'binance': BinanceClient
-        }
-        
-        client_class = clients.get(api_name.lower())
-        if not client_class:
+        try:
+            return _CLIENTS[api_name.lower()](config)
+        except KeyError:
             raise ValueError(f"Cliente de API não suportado: {api_name}")
-        
-        return client_class(config)
-    
+
     @staticmethod
     def get_supported_apis() -> List[str]:
         """Retorna lista de APIs suportadas"""
-        return ['bybit', 'binance']
\ No newline at end of file
+        return list(_CLIENTS)
\ No newline at end of file
@@ -1,8 +1,18 @@
 import os
+import json
 from typing import Dict, List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 class DatabaseConfig(BaseModel):
+    # extra='ignore' evita validação/armazenamento de chaves desconhecidas
+    # vindas de config.json antigos
+    model_config = ConfigDict(extra='ignore')
+
     host: str = Field(default="localhost", description="Host do banco de dados")
     port: int = Field(default=3306, description="Porta do banco de dados")
     user: str = Field(default="crypto_collector", description="Usuário do banco")
@@ -13,6 +23,8 @@ class DatabaseConfig(BaseModel):
         return f"mysql+pymysql://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
 
 class APIConfig(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+
     name: str = Field(description="Nome da API")
     base_url: str = Field(description="URL base da API")
     rate_limit: float = Field(description="Limite de requisições por segundo")
@@ -20,6 +32,8 @@ class APIConfig(BaseModel):
     max_retries: int = Field(default=3, description="Máximo de tentativas")
     
 class SystemConfig(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+
     # Configurações do banco
     database: DatabaseConfig = Field(default_factory=DatabaseConfig)
     
@@ -35,6 +49,9 @@ class SystemConfig(BaseModel):
     # Configurações de timing
     collection_interval: int = Field(default=60, description="Intervalo entre coletas em segundos")
     internet_check_interval: int = Field(default=15, description="Intervalo para verificar internet em segundos")
+
+    # Configurações de concorrência
+    max_workers: int = Field(default=4, description="Número de workers para coleta em paralelo")
     
     # Configurações de retry
     max_connection_retries: int = Field(default=5, description="Máximo de tentativas de conexão")
@@ -81,6 +98,7 @@ DEFAULT_CONFIG = SystemConfig(
     
     collection_interval=60,
     internet_check_interval=15,
+    max_workers=4,
     max_connection_retries=5,
     retry_delay=15,
     log_level="INFO",
@@ -98,9 +116,9 @@ class ConfigManager:
         """Carrega configurações do arquivo ou usa configurações padrão"""
         try:
             if os.path.exists(self.config_path):
-                import json
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    config_data = json.load(f)
+                with open(self.config_path, 'rb') as f:
+                    raw = f.read()
+                config_data = orjson.loads(raw) if orjson is not None else json.loads(raw)
                 return SystemConfig(**config_data)
             else:
                 self.save_config(DEFAULT_CONFIG)
@@ -112,9 +130,12 @@ class ConfigManager:
     def save_config(self, config: SystemConfig) -> None:
         """Salva configurações no arquivo"""
         try:
-            import json
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(config.model_dump(), f, indent=2, ensure_ascii=False)
+            if orjson is not None:
+                with open(self.config_path, 'wb') as f:
+                    f.write(orjson.dumps(config.model_dump(), option=orjson.OPT_INDENT_2))
+            else:
+                with open(self.config_path, 'w', encoding='utf-8') as f:
+                    json.dump(config.model_dump(), f, indent=2, ensure_ascii=False)
         except Exception as e:
             print(f"Erro ao salvar configurações: {e}")
     
@@ -1,15 +1,73 @@
 import time
 import logging
-from datetime import datetime, timedelta
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from typing import List, Optional, Dict
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from config import ConfigManager, SystemConfig
-from models import DatabaseManager, CandleModel, StatusModel
+from models import DatabaseManager, PRICE_SCALE
 from api_client import APIClientFactory
 from network_utils import NetworkChecker
 
+# Janela padrão de histórico para a primeira coleta de um símbolo
+THIRTY_DAYS_MS = 30 * 24 * 60 * 60 * 1000
+
+class AIMDController:
+    """Controlador AIMD de concorrência do pool de coleta
+
+    Aumenta a concorrência de forma aditiva (+alpha) enquanto a latência
+    média fica dentro do alvo e corta multiplicativamente (*beta) em
+    erros ou picos de latência, mantendo o pool perto do ponto ótimo
+    sem ajuste manual.
+    """
+
+    def __init__(self, c_min: int = 1, c_max: int = 16, alpha: float = 0.5,
+                 beta: float = 0.5, window: int = 8, latency_target: float = 15.0):
+        self.c_min = c_min
+        self.c_max = c_max
+        self.alpha = alpha
+        self.beta = beta
+        self.latency_target = latency_target
+
+        self._c = float(max(c_min, c_max // 2))
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    @property
+    def concurrency(self) -> int:
+        """Concorrência atual permitida pelo controlador"""
+        with self._lock:
+            return max(self.c_min, int(self._c))
+
+    def update(self, latency: float, error: bool = False) -> None:
+        """Registra o resultado de uma tarefa e ajusta a concorrência"""
+        with self._lock:
+            if error:
+                self._decrease()
+                return
+
+            self._latencies.append(latency)
+            mean = sum(self._latencies) / len(self._latencies)
+
+            if mean > self.latency_target:
+                self._decrease()
+                self._latencies.clear()
+            else:
+                self._c = min(self.c_max, self._c + self.alpha)
+
+    def on_error(self) -> None:
+        """Corta a concorrência imediatamente após um erro"""
+        with self._lock:
+            self._decrease()
+
+    def _decrease(self) -> None:
+        self._c = max(self.c_min, self._c * self.beta)
+
 class DataCollector:
     """Classe principal para coleta de dados de criptomoedas"""
     
@@ -18,16 +76,55 @@ class DataCollector:
         self.config = config_manager.get_config()
         self.logger = self._setup_logging()
         
+        # Configuração da API selecionada, resolvida uma única vez
+        self.api_config = self.config.apis[self.config.selected_api]
+
         # Inicializar componentes
-        self.network_checker = NetworkChecker(timeout=self.config.apis[self.config.selected_api].timeout)
+        self.network_checker = NetworkChecker(timeout=self.api_config.timeout)
         self.api_client = APIClientFactory.create_client(
-            self.config.selected_api, 
-            self.config.apis[self.config.selected_api]
+            self.config.selected_api,
+            self.api_config
         )
         
         # Inicializar banco de dados
-        self.engine = create_engine(self.config.database.get_connection_string())
+        # query_cache_size maior mantém os statements quentes no cache
+        # compilado do SQLAlchemy durante a coleta contínua
+        self.engine = create_engine(
+            self.config.database.get_connection_string(),
+            query_cache_size=1200
+        )
         self.db_manager = DatabaseManager(self.engine)
+
+        # Timestamp de referência do ciclo atual (ms), atualizado a cada coleta
+        self._cycle_now_ms = time.time_ns() // 1_000_000
+
+        # Cache em memória do último update por símbolo (ms), para evitar
+        # um SELECT de status por símbolo a cada ciclo
+        self._status_cache: Dict[str, int] = {}
+        self._status_cache_lock = threading.Lock()
+        self._warm_status_cache()
+
+        # Timestamps mais recentes por símbolo, pré-carregados em uma única
+        # query no início de cada ciclo (None = prefetch indisponível)
+        self._latest_ts_cache: Optional[Dict[str, int]] = None
+
+        # Fila de escrita no banco: os workers de rede enfileiram lotes e
+        # atualizações de status, e uma única thread consumidora os aplica
+        # com uma sessão persistente, sobrepondo a latência da API com a
+        # do banco
+        self._db_queue: queue.Queue = queue.Queue(maxsize=16)
+        self._insert_counts: Dict[str, int] = {}
+        self._insert_counts_lock = threading.Lock()
+        self._db_writer = threading.Thread(
+            target=self._db_writer_loop, name='db-writer', daemon=True
+        )
+        self._db_writer.start()
+
+        # Controlador de concorrência adaptativo (persiste entre ciclos)
+        self._aimd = AIMDController(
+            c_max=self.config.max_workers,
+            latency_target=self.api_config.timeout / 2
+        )
         
         self.logger.info(f"DataCollector inicializado com API: {self.config.selected_api}")
     
@@ -58,6 +155,95 @@ class DataCollector:
         
         return logger
     
+    def _warm_status_cache(self) -> None:
+        """Carrega do banco o último update de cada símbolo, uma única vez"""
+        try:
+            with self.db_manager.get_session() as session:
+                statuses = self.db_manager.get_all_statuses(
+                    session, self.config.selected_api
+                )
+
+                for status in statuses.values():
+                    if status.status_code == 'success' and status.last_update:
+                        self._status_cache[status.symbol] = int(status.last_update.timestamp() * 1000)
+        except Exception as e:
+            self.logger.warning(f"Não foi possível carregar cache de status: {e}")
+
+    def _db_writer_loop(self) -> None:
+        """Consome a fila de escrita com uma única sessão persistente
+
+        Itens: ('rows', symbol, rows) para inserir um lote de candles e
+        ('status', symbol, latest_timestamp, error_message) para gravar o
+        status de um símbolo. A fila é FIFO com um único consumidor, então
+        o status de um símbolo só é gravado depois de todos os seus lotes.
+        Um item None encerra a thread.
+        """
+        session = self.db_manager.get_session()
+        try:
+            while True:
+                item = self._db_queue.get()
+                try:
+                    if item is None:
+                        break
+
+                    if item[0] == 'rows':
+                        _, symbol, rows = item
+                        try:
+                            inserted = self.db_manager.bulk_insert_candles_fast(
+                                session, rows
+                            )
+                        except Exception:
+                            session.rollback()
+                            inserted = self.db_manager.bulk_upsert_candles(
+                                session, rows
+                            )
+
+                        with self._insert_counts_lock:
+                            self._insert_counts[symbol] = \
+                                self._insert_counts.get(symbol, 0) + inserted
+
+                    elif item[0] == 'status':
+                        _, symbol, latest_timestamp, error_message = item
+
+                        if error_message is None:
+                            total_records = self.db_manager.get_candle_count(
+                                session, symbol
+                            )
+                            self.db_manager.update_status(
+                                session=session,
+                                symbol=symbol,
+                                api_provider=self.config.selected_api,
+                                last_timestamp=latest_timestamp,
+                                total_records=total_records,
+                                status_code='success'
+                            )
+                            with self._insert_counts_lock:
+                                inserted = self._insert_counts.get(symbol, 0)
+                            self.logger.info(
+                                f"{symbol}: Coletados {inserted} novos registros. "
+                                f"Total: {total_records}"
+                            )
+                        else:
+                            self.db_manager.update_status(
+                                session=session,
+                                symbol=symbol,
+                                api_provider=self.config.selected_api,
+                                last_timestamp=0,
+                                total_records=0,
+                                status_code='error',
+                                error_message=error_message
+                            )
+                except Exception as e:
+                    try:
+                        session.rollback()
+                    except Exception:
+                        pass
+                    self.logger.error(f"Erro na thread de escrita do banco: {e}")
+                finally:
+                    self._db_queue.task_done()
+        finally:
+            session.close()
+
     def _ensure_internet_connection(self) -> bool:
         """Garante que há conectividade com a internet"""
         if not self.network_checker.check_internet_connectivity():
@@ -70,17 +256,22 @@ class DataCollector:
     
     def _get_collection_start_time(self, symbol: str) -> Optional[int]:
         """Determina o timestamp inicial para coleta de dados"""
-        with self.db_manager.get_session() as session:
-            # Verificar último timestamp no banco
-            latest_timestamp = self.db_manager.get_latest_timestamp(session, symbol)
-            
-            if latest_timestamp:
-                # Começar a partir do último timestamp + 1 minuto
-                return latest_timestamp + 60000
-            else:
-                # Se não há dados, começar de 30 dias atrás
-                start_date = datetime.now() - timedelta(days=30)
-                return int(start_date.timestamp() * 1000)
+        # Preferir o prefetch do ciclo; sem ele, consultar o banco
+        if self._latest_ts_cache is not None:
+            latest_timestamp = self._latest_ts_cache.get(symbol)
+        else:
+            session = self.db_manager.get_session()
+            try:
+                latest_timestamp = self.db_manager.get_latest_timestamp(session, symbol)
+            finally:
+                session.close()
+
+        if latest_timestamp:
+            # Começar a partir do último timestamp + 1 minuto
+            return latest_timestamp + 60000
+        else:
+            # Se não há dados, começar de 30 dias atrás
+            return self._cycle_now_ms - THIRTY_DAYS_MS
     
     def _collect_symbol_data(self, symbol: str) -> Dict:
         """Coleta dados para um símbolo específico"""
@@ -93,103 +284,91 @@ class DataCollector:
             'end_time': None
         }
         
+        # Verificar no cache se a última atualização foi há menos de 1 minuto,
+        # sem round-trip ao banco
+        last_update_ms = self._status_cache.get(symbol)
+        if last_update_ms is not None and self._cycle_now_ms - last_update_ms < 60_000:
+            self.logger.info(f"{symbol}: Dados já atualizados recentemente")
+            result['success'] = True
+            return result
+
         try:
-            with self.db_manager.get_session() as session:
-                # Verificar se precisa atualizar
-                status = self.db_manager.get_status(session, symbol, self.config.selected_api)
-                
-                if status and status.status_code == 'success':
-                    # Verificar se a última atualização foi há menos de 1 minuto
-                    last_update = status.last_update
-                    if last_update and (datetime.now() - last_update).total_seconds() < 60:
-                        self.logger.info(f"{symbol}: Dados já atualizados recentemente")
-                        result['success'] = True
-                        return result
-                
-                # Determinar período de coleta
-                start_time = self._get_collection_start_time(symbol)
-                end_time = int(datetime.now().timestamp() * 1000)
-                
-                if start_time >= end_time:
-                    self.logger.info(f"{symbol}: Não há novos dados para coletar")
-                    result['success'] = True
-                    return result
-                
-                result['start_time'] = start_time
-                result['end_time'] = end_time
-                
-                # Coletar dados da API
-                self.logger.info(f"{symbol}: Coletando dados de {datetime.fromtimestamp(start_time/1000)} até {datetime.fromtimestamp(end_time/1000)}")
-                
+            # Determinar período de coleta
+            start_time = self._get_collection_start_time(symbol)
+            end_time = self._cycle_now_ms
+
+            if start_time >= end_time:
+                self.logger.info(f"{symbol}: Não há novos dados para coletar")
+                result['success'] = True
+                return result
+
+            result['start_time'] = start_time
+            result['end_time'] = end_time
+
+            # Coletar dados da API, paginando até alcançar end_time em vez
+            # de buscar uma única página de 1000 candles por ciclo
+            self.logger.info(f"{symbol}: Coletando dados de {datetime.fromtimestamp(start_time/1000)} até {datetime.fromtimestamp(end_time/1000)}")
+
+            pages = 0
+            latest_timestamp = None
+            page_start = start_time
+
+            while page_start < end_time:
                 klines = self.api_client.get_klines(
                     symbol=symbol,
                     interval='1',
-                    start_time=start_time,
+                    start_time=page_start,
                     end_time=end_time,
                     limit=1000
                 )
-                
+
                 if not klines:
-                    self.logger.warning(f"{symbol}: Nenhum dado retornado pela API")
-                    result['success'] = True
-                    return result
-                
-                # Converter para modelos do banco
-                candle_models = []
-                for kline in klines:
-                    candle = CandleModel(
-                        symbol=symbol,
-                        interval_time='1m',
-                        open_price=kline['open'],
-                        high_price=kline['high'],
-                        low_price=kline['low'],
-                        close_price=kline['close'],
-                        volume=kline['volume'],
-                        timestamp=kline['open_time']
-                    )
-                    candle_models.append(candle)
-                
-                # Inserir no banco
-                inserted_count = self.db_manager.insert_candles(session, candle_models)
-                
-                # Atualizar status
-                latest_timestamp = max(kline['open_time'] for kline in klines) if klines else start_time
-                total_records = self.db_manager.get_candle_count(session, symbol)
-                
-                self.db_manager.update_status(
-                    session=session,
-                    symbol=symbol,
-                    api_provider=self.config.selected_api,
-                    last_timestamp=latest_timestamp,
-                    total_records=total_records,
-                    status_code='success'
-                )
-                
+                    break
+
+                # Enfileirar a página para a thread de escrita e seguir
+                # direto para a próxima requisição: o insert corre em
+                # paralelo com a latência da API
+                rows = klines.to_rows('1m', price_scale=PRICE_SCALE)
+                self._db_queue.put(('rows', symbol, rows))
+                pages += 1
+
+                latest_timestamp = klines.latest_open_time
+                next_start = latest_timestamp + 60000
+
+                # Proteção contra páginas que não avançam no tempo
+                if next_start <= page_start:
+                    break
+
+                page_start = next_start
+
+            if latest_timestamp is None:
+                self.logger.warning(f"{symbol}: Nenhum dado retornado pela API")
                 result['success'] = True
-                result['records_added'] = inserted_count
-                
-                self.logger.info(f"{symbol}: Coletados {inserted_count} novos registros. Total: {total_records}")
-                
+                return result
+
+            if pages > 1:
+                self.logger.info(f"{symbol}: Backlog coletado em {pages} páginas")
+
+            # Status gravado pela thread de escrita, depois de todos os
+            # lotes do símbolo (a fila é FIFO com um único consumidor)
+            self._db_queue.put(('status', symbol, latest_timestamp, None))
+
+            with self._status_cache_lock:
+                self._status_cache[symbol] = self._cycle_now_ms
+
+            result['success'] = True
+
         except Exception as e:
             error_msg = f"Erro ao coletar dados para {symbol}: {str(e)}"
             self.logger.error(error_msg)
             result['error'] = error_msg
-            
-            # Atualizar status com erro
-            try:
-                with self.db_manager.get_session() as session:
-                    self.db_manager.update_status(
-                        session=session,
-                        symbol=symbol,
-                        api_provider=self.config.selected_api,
-                        last_timestamp=0,
-                        total_records=0,
-                        status_code='error',
-                        error_message=error_msg
-                    )
-            except Exception:
-                pass
-        
+
+            # Invalidar o cache para forçar nova coleta no próximo ciclo
+            with self._status_cache_lock:
+                self._status_cache.pop(symbol, None)
+
+            self._db_queue.put(('status', symbol, 0, error_msg))
+
         return result
     
     def collect_all_symbols(self) -> List[Dict]:
@@ -202,32 +381,80 @@ class DataCollector:
             return results
         
         # Verificar conectividade com a API
-        api_config = self.config.apis[self.config.selected_api]
-        if not self.network_checker.check_api_connectivity(api_config.base_url):
+        if not self.network_checker.check_api_connectivity(self.api_config.base_url):
             self.logger.error(f"Não foi possível conectar com a API {self.config.selected_api}")
             return results
         
-        self.logger.info(f"Iniciando coleta para {len(self.config.tokens)} símbolos")
-        
-        #print(self.config.tokens);
+        # Um único timestamp de referência para o ciclo inteiro
+        self._cycle_now_ms = time.time_ns() // 1_000_000
 
-        for symbol in self.config.tokens:
+        # Zerar a contagem de inserções do ciclo anterior
+        with self._insert_counts_lock:
+            self._insert_counts.clear()
+
+        # Prefetch dos timestamps mais recentes de todos os símbolos em
+        # uma única query, em vez de um SELECT por símbolo nos workers
+        try:
+            with self.db_manager.get_session() as session:
+                self._latest_ts_cache = self.db_manager.get_latest_timestamps_bulk(
+                    session, self.config.tokens
+                )
+        except Exception as e:
+            self.logger.warning(f"Não foi possível pré-carregar timestamps: {e}")
+            self._latest_ts_cache = None
+
+        self.logger.info(f"Iniciando coleta para {len(self.config.tokens)} símbolos "
+                         f"com até {self.config.max_workers} workers "
+                         f"(concorrência atual: {self._aimd.concurrency})")
+
+        # Controle de tarefas em voo para o controlador AIMD
+        cond = threading.Condition()
+        state = {'inflight': 0}
+
+        def run_symbol(symbol: str) -> Dict:
+            start = time.monotonic()
             try:
                 result = self._collect_symbol_data(symbol)
-                results.append(result)
-                
-                # Aguardar entre requisições para respeitar rate limit
-                time.sleep(api_config.rate_limit)
-                
-            except Exception as e:
-                self.logger.error(f"Erro crítico ao processar {symbol}: {e}")
-                results.append({
-                    'symbol': symbol,
-                    'success': False,
-                    'records_added': 0,
-                    'error': str(e)
-                })
+                self._aimd.update(time.monotonic() - start,
+                                  error=result.get('error') is not None)
+                return result
+            finally:
+                with cond:
+                    state['inflight'] -= 1
+                    cond.notify()
+
+        # Coletar símbolos em paralelo; o rate limit é controlado pelo APIClient
+        # e a concorrência efetiva pelo controlador AIMD
+        with ThreadPoolExecutor(max_workers=self.config.max_workers) as executor:
+            futures = {}
+            for symbol in self.config.tokens:
+                with cond:
+                    while state['inflight'] >= self._aimd.concurrency:
+                        cond.wait()
+                    state['inflight'] += 1
+                futures[executor.submit(run_symbol, symbol)] = symbol
+
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    self.logger.error(f"Erro crítico ao processar {symbol}: {e}")
+                    results.append({
+                        'symbol': symbol,
+                        'success': False,
+                        'records_added': 0,
+                        'error': str(e)
+                    })
         
+        # Aguardar a thread de escrita drenar a fila antes do resumo, para
+        # que as contagens de inserção do ciclo estejam completas
+        self._db_queue.join()
+
+        with self._insert_counts_lock:
+            for result in results:
+                result['records_added'] = self._insert_counts.get(result['symbol'], 0)
+
         # Resumo da coleta
         successful = sum(1 for r in results if r['success'])
         total_records = sum(r['records_added'] for r in results)
@@ -267,6 +494,16 @@ class DataCollector:
                 self.logger.error(f"Erro crítico na coleta contínua: {e}")
                 time.sleep(60)  # Aguardar 1 minuto antes de tentar novamente
     
+    def close(self) -> None:
+        """Libera os recursos de rede e de banco do coletor"""
+        # Sentinela encerra a thread de escrita depois de drenar a fila
+        self._db_queue.put(None)
+        self._db_writer.join(timeout=30)
+
+        self.api_client.close()
+        self.network_checker.close()
+        self.engine.dispose()
+
     def get_collection_stats(self) -> Dict:
         """Retorna estatísticas da coleta"""
         stats = {
@@ -276,17 +513,22 @@ class DataCollector:
             'api_provider': self.config.selected_api
         }
         
+        # Uma única query agregada em vez de COUNT + SELECT por símbolo
         with self.db_manager.get_session() as session:
-            for symbol in self.config.tokens:
-                count = self.db_manager.get_candle_count(session, symbol)
-                status = self.db_manager.get_status(session, symbol, self.config.selected_api)
-                
-                stats['symbols_data'][symbol] = {
-                    'total_records': count,
-                    'last_update': status.last_update.isoformat() if status and status.last_update else None,
-                    'status': status.status_code if status else 'unknown'
-                }
-                
-                stats['total_records'] += count
-        
+            per_symbol = self.db_manager.get_collection_stats_bulk(
+                session, self.config.tokens, self.config.selected_api
+            )
+
+        empty = {'total_records': 0, 'status': 'unknown', 'last_update': None}
+        for symbol in self.config.tokens:
+            data = per_symbol.get(symbol, empty)
+
+            stats['symbols_data'][symbol] = {
+                'total_records': data['total_records'],
+                'last_update': data['last_update'].isoformat() if data['last_update'] else None,
+                'status': data['status']
+            }
+
+            stats['total_records'] += data['total_records']
+
         return stats
\ No newline at end of file
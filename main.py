@@ -6,7 +6,6 @@ Desenvolvido para coletar dados de candlesticks de APIs como Bybit e Binance
 
 import sys
 import argparse
-import json
 from datetime import datetime
 from typing import Dict, List
 
@@ -22,26 +21,36 @@ class CryptoCollectorApp:
         self.config_manager = ConfigManager()
         self.data_collector = DataCollector(self.config_manager)
     
+    def close(self) -> None:
+        """Libera os recursos da aplicação (sessões HTTP e pool do banco)"""
+        self.data_collector.close()
+
     def run_single_collection(self) -> None:
         """Executa uma única coleta de dados"""
         print("=== Executando Coleta Única ===")
         results = self.data_collector.collect_all_symbols()
-        
-        # Exibir resultados
-        print(f"\nResultados da Coleta:")
-        print(f"{'Símbolo':<12} {'Status':<10} {'Registros':<10} {'Erro'}")
-        print("-" * 60)
-        
+
+        # Montar o relatório em memória e emitir em um único write,
+        # em vez de um print (lock + flush) por linha
+        lines = [
+            "\nResultados da Coleta:",
+            f"{'Símbolo':<12} {'Status':<10} {'Registros':<10} {'Erro'}",
+            "-" * 60
+        ]
+
         for result in results:
             status = "✓ OK" if result['success'] else "✗ ERRO"
             error = result.get('error', '')[:30] if result.get('error') else ''
-            print(f"{result['symbol']:<12} {status:<10} {result['records_added']:<10} {error}")
-        
+            lines.append(f"{result['symbol']:<12} {status:<10} {result['records_added']:<10} {error}")
+
         # Resumo
         successful = sum(1 for r in results if r['success'])
         total_records = sum(r['records_added'] for r in results)
-        print(f"\nResumo: {successful}/{len(results)} símbolos processados")
-        print(f"Total de novos registros: {total_records}")
+        lines.append(f"\nResumo: {successful}/{len(results)} símbolos processados")
+        lines.append(f"Total de novos registros: {total_records}")
+
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
     
     def run_continuous_collection(self) -> None:
         """Executa coleta contínua"""
@@ -59,14 +68,16 @@ class CryptoCollectorApp:
         """Exibe estatísticas da coleta"""
         print("=== Estatísticas da Coleta ===")
         stats = self.data_collector.get_collection_stats()
-        
-        print(f"API Provider: {stats['api_provider']}")
-        print(f"Total de Símbolos: {stats['total_symbols']}")
-        print(f"Total de Registros: {stats['total_records']}")
-        print(f"\nDetalhes por Símbolo:")
-        print(f"{'Símbolo':<12} {'Registros':<10} {'Status':<10} {'Última Atualização'}")
-        print("-" * 70)
-        
+
+        lines = [
+            f"API Provider: {stats['api_provider']}",
+            f"Total de Símbolos: {stats['total_symbols']}",
+            f"Total de Registros: {stats['total_records']}",
+            "\nDetalhes por Símbolo:",
+            f"{'Símbolo':<12} {'Registros':<10} {'Status':<10} {'Última Atualização'}",
+            "-" * 70
+        ]
+
         for symbol, data in stats['symbols_data'].items():
             last_update = data['last_update']
             if last_update:
@@ -74,8 +85,11 @@ class CryptoCollectorApp:
                 last_update_str = last_update.strftime('%d/%m %H:%M')
             else:
                 last_update_str = "Nunca"
-            
-            print(f"{symbol:<12} {data['total_records']:<10} {data['status']:<10} {last_update_str}")
+
+            lines.append(f"{symbol:<12} {data['total_records']:<10} {data['status']:<10} {last_update_str}")
+
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
     
     def configure_system(self) -> None:
         """Interface para configurar o sistema"""
@@ -273,9 +287,10 @@ def main():
     
     args = parser.parse_args()
     
+    app = None
     try:
         app = CryptoCollectorApp()
-        
+
         if args.single:
             app.run_single_collection()
         elif args.continuous:
@@ -320,6 +335,9 @@ def main():
     except Exception as e:
         print(f"Erro crítico: {e}")
         sys.exit(1)
+    finally:
+        if app is not None:
+            app.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
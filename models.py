@@ -1,12 +1,26 @@
+import json
+import os
 from datetime import datetime
-from typing import Optional, List
-from sqlalchemy import Column, Integer, String, DECIMAL, BigInteger, Text, TIMESTAMP, UniqueConstraint, Index
+from typing import Dict, Optional, List
+from sqlalchemy import Column, Integer, String, BigInteger, Text, TIMESTAMP, UniqueConstraint, Index, select, bindparam, and_, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 Base = declarative_base()
 
+# Fator de escala dos preços/volumes: valores são armazenados como
+# inteiros de 8 casas decimais ("satoshis"), evitando o custo de
+# decimal.Decimal no caminho de inserção e leitura
+PRICE_SCALE = 10 ** 8
+
 class CandleModel(Base):
     """Modelo para armazenar dados de candlesticks"""
     
@@ -15,11 +29,13 @@ class CandleModel(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     symbol = Column(String(50), nullable=False, index=True)
     interval_time = Column(String(10), nullable=False, default='1m')
-    open_price = Column(DECIMAL(20, 8), nullable=False)
-    high_price = Column(DECIMAL(20, 8), nullable=False)
-    low_price = Column(DECIMAL(20, 8), nullable=False)
-    close_price = Column(DECIMAL(20, 8), nullable=False)
-    volume = Column(DECIMAL(20, 8), nullable=False)
+    # Preços e volume escalados por PRICE_SCALE (BIGINT em vez de
+    # DECIMAL): o caminho inteiro dispensa decimal.Decimal por linha
+    open_price = Column(BigInteger, nullable=False)
+    high_price = Column(BigInteger, nullable=False)
+    low_price = Column(BigInteger, nullable=False)
+    close_price = Column(BigInteger, nullable=False)
+    volume = Column(BigInteger, nullable=False)
     timestamp = Column(BigInteger, nullable=False, index=True)
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
@@ -31,23 +47,29 @@ class CandleModel(Base):
     )
     
     def __repr__(self):
-        return f"<Candle(symbol='{self.symbol}', timestamp={self.timestamp}, close={self.close_price})>"
+        return f"<Candle(symbol='{self.symbol}', timestamp={self.timestamp}, close={self.close_price / PRICE_SCALE})>"
     
+    # Chaves do to_dict na ordem dos valores; dict(zip(...)) evita
+    # remontar o literal de 11 chaves a cada candle serializado
+    _DICT_KEYS = ('id', 'symbol', 'interval_time', 'open_price', 'high_price',
+                  'low_price', 'close_price', 'volume', 'timestamp',
+                  'created_at', 'updated_at')
+
     def to_dict(self):
         """Converte o modelo para dicionário"""
-        return {
-            'id': self.id,
-            'symbol': self.symbol,
-            'interval_time': self.interval_time,
-            'open_price': float(self.open_price),
-            'high_price': float(self.high_price),
-            'low_price': float(self.low_price),
-            'close_price': float(self.close_price),
-            'volume': float(self.volume),
-            'timestamp': self.timestamp,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return dict(zip(self._DICT_KEYS, (
+            self.id,
+            self.symbol,
+            self.interval_time,
+            self.open_price / PRICE_SCALE,
+            self.high_price / PRICE_SCALE,
+            self.low_price / PRICE_SCALE,
+            self.close_price / PRICE_SCALE,
+            self.volume / PRICE_SCALE,
+            self.timestamp,
+            self.created_at.isoformat() if self.created_at else None,
+            self.updated_at.isoformat() if self.updated_at else None
+        )))
 
 class StatusModel(Base):
     """Modelo para controlar status das atualizações"""
@@ -74,33 +96,65 @@ class StatusModel(Base):
     def __repr__(self):
         return f"<Status(symbol='{self.symbol}', api='{self.api_provider}', status='{self.status_code}')>"
     
+    _DICT_KEYS = ('id', 'symbol', 'api_provider', 'last_update',
+                  'last_timestamp', 'total_records', 'status_code',
+                  'error_message', 'created_at', 'updated_at')
+
     def to_dict(self):
         """Converte o modelo para dicionário"""
-        return {
-            'id': self.id,
-            'symbol': self.symbol,
-            'api_provider': self.api_provider,
-            'last_update': self.last_update.isoformat() if self.last_update else None,
-            'last_timestamp': self.last_timestamp,
-            'total_records': self.total_records,
-            'status_code': self.status_code,
-            'error_message': self.error_message,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        return dict(zip(self._DICT_KEYS, (
+            self.id,
+            self.symbol,
+            self.api_provider,
+            self.last_update.isoformat() if self.last_update else None,
+            self.last_timestamp,
+            self.total_records,
+            self.status_code,
+            self.error_message,
+            self.created_at.isoformat() if self.created_at else None,
+            self.updated_at.isoformat() if self.updated_at else None
+        )))
+
+# DDL já executado neste processo: evita repetir os round-trips de
+# SHOW TABLES do create_all a cada instanciação do DatabaseManager
+_SCHEMA_READY = False
 
 class DatabaseManager:
     """Gerenciador de operações do banco de dados"""
-    
+
     def __init__(self, engine):
+        global _SCHEMA_READY
+
         self.engine = engine
-        Base.metadata.create_all(engine)
-    
+
+        # SKIP_SCHEMA_CREATE=1 pula o DDL por completo em ambientes com
+        # o schema já migrado (invocações curtas de CLI, por exemplo)
+        if not _SCHEMA_READY and os.getenv('SKIP_SCHEMA_CREATE') != '1':
+            Base.metadata.create_all(engine, checkfirst=True)
+            _SCHEMA_READY = True
+
+        # Fábrica de sessões criada uma única vez; expire_on_commit=False
+        # evita SELECTs extras quando o coletor reutiliza instâncias após
+        # o commit
+        self._Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+        # Statements quentes pré-construídos com bindparam: a construção
+        # da query é paga uma vez e o cache compilado do engine reutiliza
+        # o SQL gerado a cada execução
+        self._stmt_latest_ts = select(func.max(CandleModel.timestamp)).where(
+            CandleModel.symbol == bindparam('symbol')
+        )
+        self._stmt_candle_count = select(func.count(CandleModel.id)).where(
+            CandleModel.symbol == bindparam('symbol')
+        )
+        self._stmt_status = select(StatusModel).where(
+            StatusModel.symbol == bindparam('symbol'),
+            StatusModel.api_provider == bindparam('api_provider')
+        )
+
     def get_session(self) -> Session:
         """Retorna nova sessão do banco"""
-        from sqlalchemy.orm import sessionmaker
-        Session = sessionmaker(bind=self.engine)
-        return Session()
+        return self._Session()
     
     def get_candles(self, session: Session, symbol: str, 
                    start_time: Optional[int] = None, 
@@ -123,64 +177,233 @@ class DatabaseManager:
         return query.all()
     
     def insert_candles(self, session: Session, candles: List[CandleModel]) -> int:
-        """Insere candles no banco, ignorando duplicatas"""
+        """Insere candles no banco em lote, ignorando duplicatas"""
+        if not candles:
+            return 0
+
+        rows = [
+            {
+                'symbol': candle.symbol,
+                'interval_time': candle.interval_time,
+                'open_price': candle.open_price,
+                'high_price': candle.high_price,
+                'low_price': candle.low_price,
+                'close_price': candle.close_price,
+                'volume': candle.volume,
+                'timestamp': candle.timestamp
+            }
+            for candle in candles
+        ]
+
+        try:
+            # Caminho rápido: o lote inteiro em um único statement
+            return self.bulk_upsert_candles(session, rows)
+        except Exception:
+            session.rollback()
+
+        # Fallback linha a linha caso o lote inteiro falhe
         inserted_count = 0
-        
-        for candle in candles:
+
+        for row in rows:
             try:
-                session.add(candle)
+                session.execute(CandleModel.__table__.insert().values(row))
                 session.commit()
                 inserted_count += 1
-            except Exception as e:
+            except IntegrityError:
+                # Duplicata: ignorar sem formatar a exceção
                 session.rollback()
-                # Ignora duplicatas
-                if "Duplicate entry" in str(e):
-                    continue
-                else:
-                    raise e
-        
+                continue
+            except Exception:
+                session.rollback()
+                raise
+
         return inserted_count
     
+    def bulk_insert_candles_fast(self, session: Session, rows: List[dict]) -> int:
+        """Insere candles em lote sem a rede de segurança de duplicatas
+
+        bulk_insert_mappings pula o identity map do ORM e emite um único
+        INSERT executemany. Só deve ser usado quando o chamador sabe que
+        o lote não colide com linhas existentes (coleta incremental a
+        partir do MAX(timestamp)); em caso de colisão, a exceção sobe e
+        o chamador recorre ao upsert.
+        """
+        if not rows:
+            return 0
+
+        session.bulk_insert_mappings(CandleModel, rows)
+        session.commit()
+        return len(rows)
+
+    def bulk_upsert_candles(self, session: Session, rows: List[dict]) -> int:
+        """Insere candles em lote com INSERT ... ON DUPLICATE KEY UPDATE
+
+        Um único round-trip para o lote inteiro; duplicatas (mesmo
+        symbol/interval_time/timestamp) são atualizadas em vez de
+        gerarem erro.
+        """
+        if not rows:
+            return 0
+
+        stmt = mysql_insert(CandleModel.__table__).values(rows)
+        stmt = stmt.on_duplicate_key_update(
+            open_price=stmt.inserted.open_price,
+            high_price=stmt.inserted.high_price,
+            low_price=stmt.inserted.low_price,
+            close_price=stmt.inserted.close_price,
+            volume=stmt.inserted.volume
+        )
+
+        result = session.execute(stmt)
+        session.commit()
+
+        # MySQL conta 2 para linhas atualizadas, então limitamos ao tamanho do lote
+        return min(result.rowcount, len(rows))
+
+    def get_all_statuses(self, session: Session, api_provider: str) -> Dict[str, StatusModel]:
+        """Busca o status de todos os símbolos de um provedor em uma única query
+
+        Evita um SELECT por símbolo no loop de coleta (N+1).
+        """
+        statuses = session.query(StatusModel).filter(
+            StatusModel.api_provider == api_provider
+        ).all()
+
+        return {status.symbol: status for status in statuses}
+
+    def get_latest_timestamps_bulk(self, session: Session, symbols: List[str]) -> Dict[str, int]:
+        """Busca o timestamp mais recente de cada símbolo em uma única query
+
+        Símbolos sem candles não aparecem no dicionário retornado.
+        """
+        if not symbols:
+            return {}
+
+        rows = session.query(
+            CandleModel.symbol, func.max(CandleModel.timestamp)
+        ).filter(
+            CandleModel.symbol.in_(symbols)
+        ).group_by(CandleModel.symbol).all()
+
+        return {symbol: timestamp for symbol, timestamp in rows}
+
+    def get_collection_stats_bulk(self, session: Session, symbols: List[str],
+                                  api_provider: str) -> Dict[str, dict]:
+        """Conta candles e busca o status de todos os símbolos em uma query
+
+        Um LEFT JOIN agregado entre candles e status substitui os pares
+        COUNT + SELECT por símbolo nas estatísticas (N+1).
+        """
+        if not symbols:
+            return {}
+
+        rows = session.query(
+            CandleModel.symbol,
+            func.count(CandleModel.id),
+            StatusModel.status_code,
+            StatusModel.last_update
+        ).outerjoin(
+            StatusModel, and_(
+                StatusModel.symbol == CandleModel.symbol,
+                StatusModel.api_provider == api_provider
+            )
+        ).filter(
+            CandleModel.symbol.in_(symbols)
+        ).group_by(
+            CandleModel.symbol, StatusModel.status_code, StatusModel.last_update
+        ).all()
+
+        return {
+            symbol: {
+                'total_records': count,
+                'status': status_code or 'unknown',
+                'last_update': last_update
+            }
+            for symbol, count, status_code, last_update in rows
+        }
+
     def get_status(self, session: Session, symbol: str, api_provider: str) -> Optional[StatusModel]:
         """Busca status de um símbolo"""
-        return session.query(StatusModel).filter(
-            StatusModel.symbol == symbol,
-            StatusModel.api_provider == api_provider
-        ).first()
+        return session.execute(
+            self._stmt_status,
+            {'symbol': symbol, 'api_provider': api_provider}
+        ).scalars().first()
     
-    def update_status(self, session: Session, symbol: str, api_provider: str, 
-                     last_timestamp: int, total_records: int, 
+    def update_status(self, session: Session, symbol: str, api_provider: str,
+                     last_timestamp: int, total_records: int,
                      status_code: str = 'success', error_message: str = None) -> None:
-        """Atualiza status de um símbolo"""
-        status = self.get_status(session, symbol, api_provider)
-        
-        if status:
-            status.last_update = func.now()
-            status.last_timestamp = last_timestamp
-            status.total_records = total_records
-            status.status_code = status_code
-            status.error_message = error_message
-        else:
-            status = StatusModel(
-                symbol=symbol,
-                api_provider=api_provider,
-                last_timestamp=last_timestamp,
-                total_records=total_records,
-                status_code=status_code,
-                error_message=error_message
-            )
-            session.add(status)
-        
+        """Atualiza status de um símbolo em um único upsert
+
+        INSERT ... ON DUPLICATE KEY UPDATE sobre a unique (symbol,
+        api_provider) substitui o par SELECT + UPDATE-ou-INSERT: um
+        round-trip em vez de três e sem janela de corrida entre a
+        leitura e a escrita.
+        """
+        stmt = mysql_insert(StatusModel.__table__).values(
+            symbol=symbol,
+            api_provider=api_provider,
+            last_timestamp=last_timestamp,
+            total_records=total_records,
+            status_code=status_code,
+            error_message=error_message
+        )
+        stmt = stmt.on_duplicate_key_update(
+            last_update=func.now(),
+            last_timestamp=stmt.inserted.last_timestamp,
+            total_records=stmt.inserted.total_records,
+            status_code=stmt.inserted.status_code,
+            error_message=stmt.inserted.error_message
+        )
+
+        session.execute(stmt)
         session.commit()
     
     def get_latest_timestamp(self, session: Session, symbol: str) -> Optional[int]:
-        """Busca o timestamp mais recente para um símbolo"""
-        latest_candle = session.query(CandleModel).filter(
-            CandleModel.symbol == symbol
-        ).order_by(CandleModel.timestamp.desc()).first()
-        
-        return latest_candle.timestamp if latest_candle else None
+        """Busca o timestamp mais recente para um símbolo
+
+        MAX(timestamp) resolve direto no índice idx_symbol_timestamp,
+        sem materializar a linha como ORDER BY ... LIMIT 1 faria.
+        """
+        return session.execute(
+            self._stmt_latest_ts, {'symbol': symbol}
+        ).scalar()
     
+    def export_candles_fast(self, session: Session, symbol: str,
+                            start_time: Optional[int] = None,
+                            end_time: Optional[int] = None) -> bytes:
+        """Exporta candles de um símbolo como JSON (bytes), sem hidratar ORM
+
+        Usa um select Core com .mappings() — nenhum objeto CandleModel é
+        construído — e serializa direto com orjson quando disponível.
+        A escala dos preços é desfeita na própria query.
+        """
+        scale = 1.0 / PRICE_SCALE
+        stmt = select(
+            CandleModel.id,
+            CandleModel.symbol,
+            CandleModel.interval_time,
+            (CandleModel.open_price * scale).label('open_price'),
+            (CandleModel.high_price * scale).label('high_price'),
+            (CandleModel.low_price * scale).label('low_price'),
+            (CandleModel.close_price * scale).label('close_price'),
+            (CandleModel.volume * scale).label('volume'),
+            CandleModel.timestamp
+        ).where(CandleModel.symbol == symbol)
+
+        if start_time:
+            stmt = stmt.where(CandleModel.timestamp >= start_time)
+
+        if end_time:
+            stmt = stmt.where(CandleModel.timestamp <= end_time)
+
+        stmt = stmt.order_by(CandleModel.timestamp)
+        rows = [dict(row) for row in session.execute(stmt).mappings()]
+
+        if orjson is not None:
+            return orjson.dumps(rows, option=orjson.OPT_SERIALIZE_NUMPY)
+
+        return json.dumps(rows, default=str).encode('utf-8')
+
     def get_all_symbols(self, session: Session) -> List[str]:
         """Retorna todos os símbolos únicos no banco"""
         symbols = session.query(CandleModel.symbol).distinct().all()
@@ -188,16 +411,37 @@ class DatabaseManager:
     
     def get_candle_count(self, session: Session, symbol: str) -> int:
         """Conta total de candles para um símbolo"""
-        return session.query(CandleModel).filter(CandleModel.symbol == symbol).count()
+        return session.execute(
+            self._stmt_candle_count, {'symbol': symbol}
+        ).scalar()
     
-    def cleanup_old_data(self, session: Session, symbol: str, keep_days: int = 30) -> int:
-        """Remove dados antigos mantendo apenas os últimos N dias"""
+    def cleanup_old_data(self, session: Session, symbol: str, keep_days: int = 30,
+                         batch_size: int = 10000) -> int:
+        """Remove dados antigos mantendo apenas os últimos N dias
+
+        Apaga em lotes de DELETE ... LIMIT com commit entre eles: um
+        único DELETE gigante seguraria row locks e inflaria o undo log
+        pelo tempo todo da operação. (Particionar por RANGE(timestamp)
+        permitiria DROP PARTITION O(1), mas o MySQL exige a coluna de
+        partição em toda chave única e a PK de candles é só o id.)
+        """
         cutoff_timestamp = int((datetime.now().timestamp() - (keep_days * 24 * 60 * 60)) * 1000)
-        
-        deleted_count = session.query(CandleModel).filter(
-            CandleModel.symbol == symbol,
-            CandleModel.timestamp < cutoff_timestamp
-        ).delete()
-        
-        session.commit()
+
+        # LIMIT interpolado como inteiro: o MySQL não aceita bind param ali
+        stmt = text(
+            "DELETE FROM candles WHERE symbol = :symbol "
+            f"AND timestamp < :cutoff LIMIT {int(batch_size)}"
+        )
+
+        deleted_count = 0
+        while True:
+            result = session.execute(
+                stmt, {'symbol': symbol, 'cutoff': cutoff_timestamp}
+            )
+            session.commit()
+
+            deleted_count += result.rowcount
+            if result.rowcount < batch_size:
+                break
+
         return deleted_count
\ No newline at end of file
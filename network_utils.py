@@ -1,16 +1,43 @@
+import asyncio
+import select
 import socket
+import threading
 import time
+import httpx
 import requests
 import logging
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 from urllib.parse import urlparse
 
 class NetworkChecker:
     """Classe para verificar conectividade de rede"""
-    
-    def __init__(self, timeout: int = 5):
+
+    # TTL do cache de resolução DNS, mais longo que o dos probes: um
+    # hostname raramente muda de endereço dentro de 5 minutos
+    DNS_TTL = 300
+
+    def __init__(self, timeout: int = 5, cache_ttl: int = 30):
         self.timeout = timeout
+        self.cache_ttl = cache_ttl
         self.logger = logging.getLogger(self.__class__.__name__)
+
+        # Cache com TTL dos resultados de probes: o coletor chama as
+        # verificações a cada ciclo e repetir TCP+HTTP a cada poucos
+        # segundos não traz informação nova
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
+        # Sessão HTTP persistente: keep-alive amortiza o handshake TLS,
+        # que domina o custo dos probes HTTPS. Retry fica por conta de
+        # quem chama (wait_for_connectivity), não da camada HTTP
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16,
+                              max_retries=Retry(total=0))
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
         
         # Serviços para teste de conectividade
         self.test_urls = [
@@ -26,58 +53,166 @@ class NetworkChecker:
             '208.67.222.222'  # OpenDNS
         ]
     
+    def _cached(self, key: tuple, probe, ttl: Optional[int] = None) -> bool:
+        """Memoiza o resultado de um probe pelo TTL configurado"""
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None and time.monotonic() < entry[0]:
+                return entry[1]
+
+        value = probe()
+
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic() + (ttl or self.cache_ttl), value)
+
+        return value
+
+    def invalidate(self) -> None:
+        """Descarta os resultados em cache, forçando novos probes"""
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _resolve(self, hostname: str) -> Optional[str]:
+        """Resolve um hostname para IPv4 com cache de TTL longo
+
+        getaddrinfo com família explícita evita o caminho legado do
+        gethostbyname; endereços numéricos passam direto sem consulta.
+        Retorna None quando a resolução falha.
+        """
+        def probe():
+            try:
+                infos = socket.getaddrinfo(hostname, None, socket.AF_INET,
+                                           socket.SOCK_STREAM)
+                return infos[0][4][0]
+            except socket.gaierror:
+                return None
+
+        return self._cached(('resolve', hostname), probe, ttl=self.DNS_TTL)
+
     def check_dns_resolution(self, hostname: str = 'google.com') -> bool:
-        """Verifica se a resolução DNS está funcionando"""
-        try:
-            socket.gethostbyname(hostname)
-            return True
-        except socket.gaierror:
-            return False
-    
+        """Verifica se a resolução DNS está funcionando (com cache)"""
+        return self._resolve(hostname) is not None
+
     def check_tcp_connection(self, host: str, port: int) -> bool:
-        """Verifica conectividade TCP para host e porta específicos"""
+        """Verifica conectividade TCP para host e porta específicos (com cache)"""
+        return self._cached(('tcp', host, port),
+                            lambda: self._check_tcp_connection(host, port))
+
+    def _check_tcp_connection(self, host: str, port: int) -> bool:
+        # Conectar no endereço já resolvido, em vez de deixar o
+        # connect_ex repetir a consulta DNS
+        address = self._resolve(host)
+        if address is None:
+            return False
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(self.timeout)
-            result = sock.connect_ex((host, port))
-            sock.close()
-            return result == 0
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+            # Limitar as retransmissões do kernel ao mesmo deadline do
+            # probe (Linux); em outras plataformas a opção não existe
+            if hasattr(socket, 'TCP_USER_TIMEOUT'):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT,
+                                int(self.timeout * 1000))
+
+            # connect não bloqueante + select com deadline explícito: o
+            # probe retorna em <= timeout mesmo sob backoff do kernel
+            sock.setblocking(False)
+            if sock.connect_ex((address, port)) == 0:
+                return True
+
+            _, writable, _ = select.select([], [sock], [], self.timeout)
+            if not writable:
+                return False
+
+            return sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
         except Exception:
             return False
-    
+        finally:
+            sock.close()
+
     def check_http_connectivity(self, url: str) -> bool:
-        """Verifica conectividade HTTP para uma URL"""
+        """Verifica conectividade HTTP para uma URL (com cache)"""
+        return self._cached(('http', url),
+                            lambda: self._check_http_connectivity(url))
+
+    def _check_http_connectivity(self, url: str) -> bool:
         try:
-            response = requests.head(url, timeout=self.timeout)
+            response = self._session.head(url, timeout=self.timeout,
+                                          allow_redirects=False)
             return response.status_code < 500
         except Exception:
             return False
+
+    def close(self) -> None:
+        """Encerra a sessão HTTP persistente"""
+        self._session.close()
     
-    def check_internet_connectivity(self) -> bool:
-        """Verifica conectividade geral com a internet"""
+    async def _check_tcp_async(self, host: str, port: int) -> bool:
+        """Probe TCP assíncrono com deadline explícito"""
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port), timeout=self.timeout
+            )
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+            return True
+        except Exception:
+            return False
+
+    async def _check_http_async(self, session: httpx.AsyncClient, url: str) -> bool:
+        """Probe HTTP assíncrono usando a sessão compartilhada"""
+        try:
+            response = await session.head(url)
+            return response.status_code < 500
+        except Exception:
+            return False
+
+    @staticmethod
+    async def _any_probe_ok_async(coros) -> bool:
+        """Aguarda os probes concorrentes e retorna no primeiro sucesso"""
+        tasks = [asyncio.ensure_future(coro) for coro in coros]
+
+        try:
+            for task in asyncio.as_completed(tasks):
+                if await task:
+                    return True
+            return False
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _check_internet_connectivity_async(self) -> bool:
+        """Executa os três estágios de verificação sobre o event loop"""
         # Teste 1: Verificar DNS
         if not self.check_dns_resolution():
             self.logger.warning("Falha na resolução DNS")
             return False
-        
-        # Teste 2: Verificar conectividade TCP com servidores DNS
-        dns_ok = False
-        for dns_server in self.dns_servers:
-            if self.check_tcp_connection(dns_server, 53):
-                dns_ok = True
-                break
-        
-        if not dns_ok:
+
+        # Teste 2: Verificar conectividade TCP com servidores DNS, em paralelo
+        if not await self._any_probe_ok_async(
+                self._check_tcp_async(dns_server, 53) for dns_server in self.dns_servers):
             self.logger.warning("Falha na conectividade TCP com servidores DNS")
             return False
-        
-        # Teste 3: Verificar conectividade HTTP
-        for url in self.test_urls:
-            if self.check_http_connectivity(url):
+
+        # Teste 3: Verificar conectividade HTTP, em paralelo, com uma única
+        # sessão para amortizar os handshakes TLS
+        async with httpx.AsyncClient(timeout=self.timeout) as session:
+            if await self._any_probe_ok_async(
+                    self._check_http_async(session, url) for url in self.test_urls):
                 return True
-        
+
         self.logger.warning("Falha na conectividade HTTP com todos os serviços de teste")
         return False
+
+    def check_internet_connectivity(self) -> bool:
+        """Verifica conectividade geral com a internet (com cache)"""
+        return self._cached(
+            ('internet',),
+            lambda: asyncio.run(self._check_internet_connectivity_async()))
     
     def check_api_connectivity(self, api_url: str) -> bool:
         """Verifica conectividade específica com uma API"""
@@ -100,6 +235,10 @@ class NetworkChecker:
     def wait_for_connectivity(self, max_retries: int = 5, retry_delay: int = 15) -> bool:
         """Aguarda até que a conectividade seja restaurada"""
         for attempt in range(max_retries):
+            # Estamos aqui justamente porque a rede caiu: resultados em
+            # cache não valem nada, cada tentativa precisa de probes frescos
+            self.invalidate()
+
             if self.check_internet_connectivity():
                 self.logger.info("Conectividade restaurada")
                 return True
@@ -120,9 +259,9 @@ class NetworkChecker:
             'timestamp': time.time()
         }
         
-        # Testar conectividade com cada URL de teste
-        info['test_urls'] = {}
-        for url in self.test_urls:
-            info['test_urls'][url] = self.check_http_connectivity(url)
-        
+        # Testar conectividade com cada URL de teste, em paralelo
+        with ThreadPoolExecutor(max_workers=len(self.test_urls)) as executor:
+            results = executor.map(self.check_http_connectivity, self.test_urls)
+            info['test_urls'] = dict(zip(self.test_urls, results))
+
         return info
\ No newline at end of file